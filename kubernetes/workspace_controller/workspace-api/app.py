@@ -6,7 +6,7 @@ import json
 import uuid
 import yaml
 import string
-import random
+import secrets
 import logging
 import re
 from flask import Flask, request, jsonify
@@ -59,10 +59,11 @@ except config.config_exception.ConfigException:
     config.load_kube_config()
     logger.info("Loaded kubeconfig for local development")
 
-# Initialize Kubernetes clients
-core_v1 = client.CoreV1Api()
-apps_v1 = client.AppsV1Api()
-networking_v1 = client.NetworkingV1Api()
+# Initialize Kubernetes clients on a single shared ApiClient (and connection pool)
+api_client = client.ApiClient()
+core_v1 = client.CoreV1Api(api_client)
+apps_v1 = client.AppsV1Api(api_client)
+networking_v1 = client.NetworkingV1Api(api_client)
 
 # Get domain from config map
 try:
@@ -117,12 +118,12 @@ def token_required(f):
 def generate_random_subdomain(length=8):
     """Generate a random subdomain name"""
     letters = string.ascii_lowercase + string.digits
-    return ''.join(random.choice(letters) for i in range(length))
+    return ''.join(secrets.choice(letters) for _ in range(length))
 
 def random_password(length=12):
     """Generate a random password"""
     chars = string.ascii_letters + string.digits
-    return ''.join(random.choice(chars) for i in range(length))
+    return ''.join(secrets.choice(chars) for _ in range(length))
 
 @app.route('/api/workspaces', methods=['GET'])
 @token_required
@@ -667,9 +668,9 @@ def _create_workspace_secret(workspace_ids, github_token=None):
     core_v1.create_namespaced_secret(workspace_ids['namespace_name'], secret)
     logger.info(f"Created secret in namespace: {workspace_ids['namespace_name']}")
 
-def _create_feature_installation_script():
-    """Generate a script that handles common dev container features installation"""
-    return """#!/bin/bash
+# The feature installation script has no workspace-specific values, so it is
+# built once at import and shared by every workspace
+_FEATURE_INSTALLATION_SCRIPT = """#!/bin/bash
 # Script to install common dev container features
 set -e
 
@@ -977,6 +978,30 @@ fi
 echo "Feature installation completed"
 """
 
+
+def _create_feature_installation_script():
+    """Generate a script that handles common dev container features installation"""
+    return _FEATURE_INSTALLATION_SCRIPT
+
+
+# Wrapper Dockerfile layering code-server on top of the user's image, compiled once
+_WRAPPER_DOCKERFILE_TEMPLATE = string.Template("""# This will be replaced with the tag for the user's custom image
+FROM $base_image
+
+# Copy code-server from its prebuilt image instead of running the installer
+COPY --from=$code_server_image /usr/lib/code-server /usr/lib/code-server
+COPY --from=$code_server_image /usr/bin/code-server /usr/bin/code-server
+
+# Expose default code-server port
+EXPOSE 8444
+
+# Set up entrypoint to run code-server
+ENTRYPOINT ["/bin/bash", "-c", "if [ -f /workspaces/install-features.sh ]; then /workspaces/install-features.sh; fi && if [ -f /workspaces/setup-env.sh ]; then source /workspaces/setup-env.sh; fi && if [ -f /workspaces/install-extensions.sh ]; then /workspaces/install-extensions.sh; fi && if [ -f /workspaces/run-lifecycle.sh ]; then /workspaces/run-lifecycle.sh & fi && /usr/bin/code-server --bind-addr 0.0.0.0:8444 --auth password --user-data-dir /config/data --extensions-dir /config/extensions /workspaces"]""")
+
+# Prebuilt image the wrapper Dockerfile copies code-server from
+CODE_SERVER_IMAGE = "codercom/code-server:4.96.4"
+
+
 def _create_init_script_configmap(workspace_ids, workspace_config):
     """Create ConfigMap with initialization scripts"""
     # Start with base repository cloning script
@@ -1493,20 +1518,14 @@ EOL
     """
     
     # Add Dockerfile creation
+    wrapper_dockerfile = _WRAPPER_DOCKERFILE_TEMPLATE.substitute(
+        base_image=f"{AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-user-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}",
+        code_server_image=CODE_SERVER_IMAGE
+    )
     init_script += f"""
     # Create a wrapper Dockerfile that uses the user's image as a base
     cat > Dockerfile << 'EOF'
-# This will be replaced with the tag for the user's custom image
-FROM {AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-user-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}
-
-# Install code-server
-RUN curl -fsSL https://code-server.dev/install.sh | sh
-
-# Expose default code-server port
-EXPOSE 8444
-
-# Set up entrypoint to run code-server
-ENTRYPOINT ["/bin/bash", "-c", "if [ -f /workspaces/install-features.sh ]; then /workspaces/install-features.sh; fi && if [ -f /workspaces/setup-env.sh ]; then source /workspaces/setup-env.sh; fi && if [ -f /workspaces/install-extensions.sh ]; then /workspaces/install-extensions.sh; fi && if [ -f /workspaces/run-lifecycle.sh ]; then /workspaces/run-lifecycle.sh & fi && /usr/bin/code-server --bind-addr 0.0.0.0:8444 --auth password --user-data-dir /config/data --extensions-dir /config/extensions /workspaces"]
+{wrapper_dockerfile}
 EOF
     
     # Create a flag file to indicate setup is done
@@ -1867,7 +1886,7 @@ def _create_deployment(workspace_ids, workspace_config):
     )
 
     # Create the secret in the namespace
-    client.CoreV1Api().create_namespaced_secret(
+    core_v1.create_namespaced_secret(
         namespace=workspace_ids['namespace_name'],
         body=registry_secret
     )
@@ -2064,7 +2083,7 @@ def _create_base_image_kaniko_container(workspace_ids):
 
 def _create_wrapper_kaniko_container(workspace_ids):
     """Create container for building code-server wrapper image using Kaniko"""
-    nodes = client.CoreV1Api().list_node()
+    nodes = core_v1.list_node()
     node_ip = nodes.items[0].status.addresses[0].address
 
     return client.V1Container(
@@ -2157,8 +2176,7 @@ def create_service_workspace_account(workspace_namespace):
     )
     
     try:
-        api_instance = client.CoreV1Api()
-        api_instance.create_namespaced_service_account(
+        core_v1.create_namespaced_service_account(
             namespace=workspace_namespace,
             body=service_account
         )
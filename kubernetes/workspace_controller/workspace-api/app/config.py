@@ -6,6 +6,9 @@ from kubernetes import client, config
 
 logger = logging.getLogger(__name__)
 
+# Pinned so that rebuilding a workspace image doesn't change its editor version
+DEFAULT_CODE_SERVER_IMAGE = "codercom/code-server:4.96.4"
+
 class Config:
     def __init__(self):
         self.JWT_SECRET_KEY = None
@@ -14,6 +17,12 @@ class Config:
         self.PARENT_DOMAIN = None
         self.WORKSPACE_DOMAIN = None
         self.AWS_ACCOUNT_ID = None
+        self.WORKSPACE_ROLE_ARN = None
+        self.WORKSPACE_IMAGE_REPOSITORY = None
+        self.WORKSPACE_IMAGE_CACHE_REPOSITORY = None
+        self.WS_DEBUG = False
+        self.CODE_SERVER_IMAGE = DEFAULT_CODE_SERVER_IMAGE
+        self.api_client = None
         self.core_v1 = None
         self.apps_v1 = None
         self.networking_v1 = None
@@ -33,10 +42,18 @@ class Config:
             config.load_kube_config()
             logger.info("Loaded kubeconfig for local development")
 
-        # Initialize Kubernetes clients
-        self.core_v1 = client.CoreV1Api()
-        self.apps_v1 = client.AppsV1Api()
-        self.networking_v1 = client.NetworkingV1Api()
+        # Size the HTTP connection pool for concurrent workspace creation so that
+        # parallel requests reuse connections instead of opening and discarding them
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = 100
+        client.Configuration.set_default(configuration)
+
+        # Initialize Kubernetes clients on a single shared ApiClient, so all
+        # API groups use the same connection pool and reuse its connections
+        self.api_client = client.ApiClient(configuration)
+        self.core_v1 = client.CoreV1Api(self.api_client)
+        self.apps_v1 = client.AppsV1Api(self.api_client)
+        self.networking_v1 = client.NetworkingV1Api(self.api_client)
     
     def _load_config(self):
         """Load configuration from ConfigMap"""
@@ -46,6 +63,10 @@ class Config:
             self.PARENT_DOMAIN = config_map.data.get("parent-domain", "REPLACE_ME")
             self.WORKSPACE_DOMAIN = config_map.data.get("workspace-domain", "SUBDOMAIN_REPLACE_ME")
             self.AWS_ACCOUNT_ID = config_map.data.get("aws-account-id", "AWS_ACCOUNT_ID")
+            # Verbose output in the generated workspace scripts, off unless opted in
+            self.WS_DEBUG = config_map.data.get("ws-debug", "false").lower() == "true"
+            # Image the workspace builds copy code-server from
+            self.CODE_SERVER_IMAGE = config_map.data.get("code-server-image", DEFAULT_CODE_SERVER_IMAGE)
             logger.info(f"Using domain: {self.DOMAIN}, parent domain: {self.PARENT_DOMAIN}, workspace domain: {self.WORKSPACE_DOMAIN}")
         except Exception as e:
             logger.error(f"Error reading config map: {e}")
@@ -53,6 +74,11 @@ class Config:
             self.PARENT_DOMAIN = "REPLACE_ME"
             self.WORKSPACE_DOMAIN = "SUBDOMAIN_REPLACE_ME"
             self.AWS_ACCOUNT_ID = "AWS_ACCOUNT_ID_REPLACE_ME"
+        
+        # Derived from the account id, which is fixed for the life of the controller
+        self.WORKSPACE_ROLE_ARN = f"arn:aws:iam::{self.AWS_ACCOUNT_ID}:role/workspace-controller-role"
+        self.WORKSPACE_IMAGE_REPOSITORY = f"{self.AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images"
+        self.WORKSPACE_IMAGE_CACHE_REPOSITORY = f"{self.AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images-cache"
     
     def _load_auth_config(self):
         """Load authentication configuration"""
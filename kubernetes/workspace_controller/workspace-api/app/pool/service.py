@@ -8,6 +8,7 @@ from datetime import datetime
 from kubernetes import client
 from app.config import app_config
 from app.workspace.service import workspace_service
+from app.workspace import k8s_resources
 from app.pool.models import PoolConfig, PoolStatus
 
 logger = logging.getLogger(__name__)
@@ -576,7 +577,7 @@ class PoolService:
                     )
                     
                     if config_maps.items:
-                        workspace_info = json.loads(config_maps.items[0].data.get("info", "{}"))
+                        workspace_info = k8s_resources.read_workspace_info(config_maps.items[0])
                         
                         # Get pod status with crash detection
                         pods = self.core_v1.list_namespaced_pod(
@@ -587,6 +588,8 @@ class PoolService:
                         if pods.items:
                             pod = pods.items[0]
                             workspace_info["state"] = self._determine_pod_state(pod)
+                        elif k8s_resources.get_initialization_state(ns) == k8s_resources.INITIALIZATION_FAILED:
+                            workspace_info["state"] = "failed"  # Resources couldn't be provisioned
                         else:
                             workspace_info["state"] = "creating"  # No pods yet, still being created
                         
@@ -743,7 +746,7 @@ class PoolService:
         used_vms = len([w for w in workspaces if w.get('usage_status') == 'used' and w.get('state') == 'running'])
         unused_vms = len([w for w in workspaces if w.get('usage_status') != 'used' and w.get('state') == 'running'])
         
-        logger.debug(f"Pool {pool_name} status: total={len(workspaces)}, running={running_vms}, pending={pending_vms}, failed={failed_vms}, used={used_vms}, unused={unused_vms}, minimum={pool_config.minimum_vms}")
+        logger.debug("Pool %s status: total=%s, running=%s, pending=%s, failed=%s, used=%s, unused=%s, minimum=%s", pool_name, len(workspaces), running_vms, pending_vms, failed_vms, used_vms, unused_vms, pool_config.minimum_vms)
         
         return PoolStatus(
             pool_name=pool_name,
@@ -767,12 +770,12 @@ class PoolService:
             active_vms = status.running_vms + status.pending_vms
             needed_vms = max(0, status.minimum_vms - active_vms)
             
-            logger.info(f"Pool '{pool_name}' scaling check: minimum={status.minimum_vms}, active={active_vms} (running={status.running_vms}, pending={status.pending_vms}), needed={needed_vms}")
+            logger.info("Pool '%s' scaling check: minimum=%s, active=%s (running=%s, pending=%s), needed=%s", pool_name, status.minimum_vms, active_vms, status.running_vms, status.pending_vms, needed_vms)
             
             if needed_vms > 0:
                 pool_config = self.pools[pool_name]
                 
-                logger.info(f"Pool '{pool_name}' needs {needed_vms} more VMs")
+                logger.info("Pool '%s' needs %s more VMs", pool_name, needed_vms)
                 
                 # Create the needed workspaces
                 created_count = 0
@@ -802,17 +805,17 @@ class PoolService:
                             self._update_workspace_usage_status(namespace_name, 'unused')
                             
                             created_count += 1
-                            logger.info(f"Created workspace {workspace_id} for pool '{pool_name}' ({created_count}/{needed_vms})")
+                            logger.info("Created workspace %s for pool '%s' (%s/%s)", workspace_id, pool_name, created_count, needed_vms)
                         else:
                             logger.error(f"Failed to create workspace for pool '{pool_name}': {result}")
                             
                     except Exception as e:
                         logger.error(f"Error creating workspace for pool '{pool_name}': {e}")
                 
-                logger.info(f"Pool '{pool_name}' scaling completed: created {created_count}/{needed_vms} workspaces")
+                logger.info("Pool '%s' scaling completed: created %s/%s workspaces", pool_name, created_count, needed_vms)
                         
             else:
-                logger.debug(f"Pool '{pool_name}' does not need scaling")
+                logger.debug("Pool '%s' does not need scaling", pool_name)
                 
         except Exception as e:
             logger.error(f"Error scaling pool '{pool_name}': {e}")
@@ -834,7 +837,7 @@ class PoolService:
                     }
                 }
             )
-            logger.debug(f"Labeled namespace {namespace_name} with pool {sanitized_pool_label}")
+            logger.debug("Labeled namespace %s with pool %s", namespace_name, sanitized_pool_label)
         except Exception as e:
             logger.error(f"Error labeling namespace {namespace_name} with pool {pool_name}: {e}")
     
@@ -892,7 +895,7 @@ class PoolService:
                             finally:
                                 scaling_lock.release()
                         else:
-                            logger.debug(f"Pool '{pool_name}' scaling already in progress, skipping check")
+                            logger.debug("Pool '%s' scaling already in progress, skipping check", pool_name)
                     else:
                         logger.warning(f"Pool '{pool_name}' no longer exists, stopping monitoring")
                         break
@@ -904,6 +907,20 @@ class PoolService:
         
         logger.info(f"Stopped monitoring pool '{pool_name}'")
 
+    def _scale_after_namespace_deletion(self, pool_name: str, namespace_name: str):
+        """Scale a pool once a deleted workspace namespace has finished terminating"""
+        if not k8s_resources.wait_for_namespace_deletion(namespace_name):
+            logger.warning(f"Namespace {namespace_name} is still terminating, scaling pool '{pool_name}' anyway")
+        
+        scaling_lock = self.scaling_locks.get(pool_name)
+        if scaling_lock and scaling_lock.acquire(blocking=False):
+            try:
+                self._scale_pool(pool_name)
+            finally:
+                scaling_lock.release()
+        else:
+            logger.debug("Pool '%s' scaling already in progress, skipping check", pool_name)
+
     def _cleanup_unhealthy_workspaces(self, pool_name: str):
         """Remove workspaces that are consistently unhealthy"""
         try:
@@ -978,15 +995,15 @@ class PoolService:
             logger.info(f"Deleted workspace '{workspace_id}' from pool '{pool_name}'")
             
             # Trigger pool scaling to maintain minimum VMs (if needed)
-            # This will be done asynchronously by the monitoring thread, but we can also trigger it immediately
+            # This will be done asynchronously by the monitoring thread, but we can also trigger it
+            # as soon as the namespace is actually gone
             try:
-                scaling_lock = self.scaling_locks.get(pool_name)
-                if scaling_lock and scaling_lock.acquire(blocking=False):
-                    try:
-                        # Schedule scaling to happen soon (after a short delay to allow cleanup)
-                        threading.Timer(5.0, self._scale_pool, args=[pool_name]).start()
-                    finally:
-                        scaling_lock.release()
+                threading.Thread(
+                    target=self._scale_after_namespace_deletion,
+                    args=(pool_name, namespace_name),
+                    daemon=True,
+                    name=f"pool-rescale-{pool_name}"
+                ).start()
             except Exception as e:
                 logger.warning(f"Could not trigger immediate scaling for pool '{pool_name}': {e}")
             
@@ -1,19 +1,21 @@
 import uuid
 import time
 import string
-import random
+import secrets
+
+# Subdomains have to be valid lowercase DNS labels
+_SUBDOMAIN_ALPHABET = string.ascii_lowercase + string.digits
+_PASSWORD_ALPHABET = string.ascii_letters + string.digits
 
 
 def generate_random_subdomain(length=8):
     """Generate a random subdomain name"""
-    letters = string.ascii_lowercase + string.digits
-    return ''.join(random.choice(letters) for i in range(length))
+    return ''.join(secrets.choice(_SUBDOMAIN_ALPHABET) for _ in range(length))
 
 
 def random_password(length=12):
     """Generate a random password"""
-    chars = string.ascii_letters + string.digits
-    return ''.join(random.choice(chars) for i in range(length))
+    return ''.join(secrets.choice(_PASSWORD_ALPHABET) for _ in range(length))
 
 
 def generate_workspace_identifiers(workspace_domain):
@@ -1,3 +1,13 @@
+import functools
+import string
+from app.config import app_config
+
+
+class _ScriptTemplate(string.Template):
+    """Template for generated bash, whose own $VARS must be left alone"""
+    delimiter = "@@"
+
+
 def create_post_start_command():
     """Create the post-start command for Docker setup with explicit Debian/Ubuntu handling - runs in background"""
     return [
@@ -416,55 +426,68 @@ EOF
     return script
 
 
-def generate_comprehensive_init_script(workspace_ids, workspace_config, aws_account_id):
-    """Generate the comprehensive initialization script with devcontainer support"""
-    
-    # Get the basic init script
-    init_script = generate_init_script(workspace_ids, workspace_config)
-    
-    # Add devcontainer processing
-    repo_name = workspace_config['repo_name']
-    
-    init_script += f"""
-    # Create directory for wrapper Dockerfile and user Dockerfile
-    mkdir -p /workspaces/.code-server-wrapper
+# Layers appended to the user's Dockerfile to turn their image into a workspace
+# image. They are the same for every workspace.
+_CODE_SERVER_DOCKERFILE_LAYERS = _ScriptTemplate("""RUN git config --global --add safe.directory /workspaces && \\
+    git config --global --add safe.directory '*'
+
+# Copy code-server from its prebuilt image instead of running the installer,
+# so the layer comes from the registry cache rather than being rebuilt
+COPY --from=@@code_server_image /usr/lib/code-server /usr/lib/code-server
+# Copied rather than linked with RUN, which would fail when the user's
+# Dockerfile ends with a non-root USER
+COPY --from=@@code_server_image /usr/bin/code-server /usr/bin/code-server
+
+# Expose default code-server port
+EXPOSE 8444
+
+# Set up entrypoint to run code-server
+ENTRYPOINT ["/bin/bash", "-c", "if [ -f /workspaces/install-features.sh ]; then /workspaces/install-features.sh; fi && if [ -f /workspaces/setup-env.sh ]; then source /workspaces/setup-env.sh; fi && if [ -f /workspaces/install-extensions.sh ]; then /workspaces/install-extensions.sh; fi && if [ -f /workspaces/run-lifecycle.sh ]; then /workspaces/run-lifecycle.sh & fi && /usr/bin/code-server --bind-addr 0.0.0.0:8444 --auth password --user-data-dir /config/data --extensions-dir /config/extensions /workspaces"]""")
+
+
+# Devcontainer build context part of the init script, see _render_devcontainer_build_script
+_DEVCONTAINER_BUILD_TEMPLATE = _ScriptTemplate("""
+    WS_DEBUG="@@ws_debug"
+
+    # Create the build context for the workspace image
     mkdir -p /workspaces/.user-dockerfile
-    cd /workspaces/.code-server-wrapper
     
     # Locate the user's Dockerfile in their repo
-    USER_REPO_PATH="/workspaces/{repo_name}"
+    USER_REPO_PATH="/workspaces/@@repo_name"
     DOCKERFILE_PATH="$USER_REPO_PATH/.devcontainer/Dockerfile"
     DEVCONTAINER_JSON_PATH="$USER_REPO_PATH/.devcontainer/devcontainer.json"
     
-    # Debug info
-    echo "DEBUG: Checking repository and Dockerfile"
-    if [ -d "$USER_REPO_PATH" ]; then
-        echo "DEBUG: Repository directory exists at $USER_REPO_PATH"
-        ls -la "$USER_REPO_PATH"
-    else
-        echo "DEBUG: ERROR - Repository directory does not exist at $USER_REPO_PATH"
-    fi
-    
-    if [ -d "$USER_REPO_PATH/.devcontainer" ]; then
-        echo "DEBUG: .devcontainer directory exists"
-        ls -la "$USER_REPO_PATH/.devcontainer"
-    else
-        echo "DEBUG: .devcontainer directory does not exist"
-    fi
-    
-    if [ -f "$DOCKERFILE_PATH" ]; then
-        echo "DEBUG: Dockerfile exists at $DOCKERFILE_PATH"
-        cat "$DOCKERFILE_PATH" | head -n 10
-    else
-        echo "DEBUG: Dockerfile does not exist at $DOCKERFILE_PATH"
-    fi
+    # Debug info, only emitted when WS_DEBUG is enabled for the controller
+    if [ -n "$WS_DEBUG" ]; then
+        echo "DEBUG: Checking repository and Dockerfile"
+        if [ -d "$USER_REPO_PATH" ]; then
+            echo "DEBUG: Repository directory exists at $USER_REPO_PATH"
+            ls -la "$USER_REPO_PATH"
+        else
+            echo "DEBUG: ERROR - Repository directory does not exist at $USER_REPO_PATH"
+        fi
 
-    # Check for devcontainer.json
-    if [ -f "$DEVCONTAINER_JSON_PATH" ]; then
-        echo "DEBUG: devcontainer.json exists at $DEVCONTAINER_JSON_PATH"
-        cat "$DEVCONTAINER_JSON_PATH" | head -n 20
-    else
-        echo "DEBUG: devcontainer.json does not exist at $DEVCONTAINER_JSON_PATH"
+        if [ -d "$USER_REPO_PATH/.devcontainer" ]; then
+            echo "DEBUG: .devcontainer directory exists"
+            ls -la "$USER_REPO_PATH/.devcontainer"
+        else
+            echo "DEBUG: .devcontainer directory does not exist"
+        fi
+
+        if [ -f "$DOCKERFILE_PATH" ]; then
+            echo "DEBUG: Dockerfile exists at $DOCKERFILE_PATH"
+            cat "$DOCKERFILE_PATH" | head -n 10
+        else
+            echo "DEBUG: Dockerfile does not exist at $DOCKERFILE_PATH"
+        fi
+
+        # Check for devcontainer.json
+        if [ -f "$DEVCONTAINER_JSON_PATH" ]; then
+            echo "DEBUG: devcontainer.json exists at $DEVCONTAINER_JSON_PATH"
+            cat "$DEVCONTAINER_JSON_PATH" | head -n 20
+        else
+            echo "DEBUG: devcontainer.json does not exist at $DEVCONTAINER_JSON_PATH"
+        fi
     fi
     
     # Check if the first repository actually got cloned
@@ -473,17 +496,17 @@ def generate_comprehensive_init_script(workspace_ids, workspace_config, aws_acco
         cd /workspaces
         
         # Get the branch for the first repository
-        BRANCH="{workspace_config['github_branches'][0] if workspace_config['github_branches'] and workspace_config['github_branches'][0] else ''}"
+        BRANCH="@@branch"
         
         if [ ! -z "$BRANCH" ]; then
             echo "Cloning with specific branch: $BRANCH"
-            git clone -b $BRANCH {workspace_config['github_urls'][0]} {repo_name}
+            git clone -b $BRANCH @@url @@repo_name
         else
             echo "Cloning with default branch"
-            git clone {workspace_config['github_urls'][0]} {repo_name}
+            git clone @@url @@repo_name
         fi
 
-        git config --global --add safe.directory /workspaces/{repo_name}
+        git config --global --add safe.directory /workspaces/@@repo_name
     fi
     
     # Check again after potential re-cloning
@@ -506,7 +529,7 @@ def generate_comprehensive_init_script(workspace_ids, workspace_config, aws_acco
             fi
             
             # Process devcontainer.json content
-            {_generate_devcontainer_processing_script(repo_name)}
+            @@devcontainer_processing
         fi
         
         # Check if there's a docker-compose.yml file
@@ -526,22 +549,11 @@ def generate_comprehensive_init_script(workspace_ids, workspace_config, aws_acco
         echo "FROM mcr.microsoft.com/devcontainers/go:latest" > /workspaces/.user-dockerfile/Dockerfile
     fi
     
-    # Create a wrapper Dockerfile that uses the user's image as a base
-    cat > Dockerfile << 'EOF'
-# This will be replaced with the tag for the user's custom image
-FROM {aws_account_id}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-user-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}
-
-RUN git config --global --add safe.directory /workspaces && \
-    git config --global --add safe.directory '*'
-
-# Install code-server
-RUN curl -fsSL https://code-server.dev/install.sh | sh
-
-# Expose default code-server port
-EXPOSE 8444
-
-# Set up entrypoint to run code-server
-ENTRYPOINT ["/bin/bash", "-c", "if [ -f /workspaces/install-features.sh ]; then /workspaces/install-features.sh; fi && if [ -f /workspaces/setup-env.sh ]; then source /workspaces/setup-env.sh; fi && if [ -f /workspaces/install-extensions.sh ]; then /workspaces/install-extensions.sh; fi && if [ -f /workspaces/run-lifecycle.sh ]; then /workspaces/run-lifecycle.sh & fi && /usr/bin/code-server --bind-addr 0.0.0.0:8444 --auth password --user-data-dir /config/data --extensions-dir /config/extensions /workspaces"]
+    # Layer code-server on top of the user's image in the same build, rather than
+    # pushing the user's image and building a separate wrapper image FROM it
+    echo >> /workspaces/.user-dockerfile/Dockerfile
+    cat >> /workspaces/.user-dockerfile/Dockerfile << 'EOF'
+@@code_server_layers
 EOF
     
     # Create a flag file to indicate setup is done
@@ -549,19 +561,92 @@ EOF
     
     # Initialize workspace
     echo "Workspace initialization completed!"
-    """
+    """)
+
+
+def generate_comprehensive_init_script(workspace_ids, workspace_config):
+    """Generate the comprehensive initialization script with devcontainer support"""
+    
+    # Get the basic init script
+    init_script = generate_init_script(workspace_ids, workspace_config)
+    
+    # Add devcontainer processing
+    init_script += _render_devcontainer_build_script(
+        workspace_config['repo_name'],
+        workspace_config['github_urls'][0],
+        workspace_config['github_branches'][0] if workspace_config['github_branches'] and workspace_config['github_branches'][0] else ''
+    )
     
     return init_script
 
 
-def _generate_devcontainer_processing_script(repo_name):
-    """Generate the devcontainer.json processing script"""
-    return f"""
-            # Extract extensions from devcontainer.json (support both formats)
-            EXTENSIONS=$(jq -r '.extensions[]? // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            if [ -z "$EXTENSIONS" ]; then
-                EXTENSIONS=$(jq -r '.customizations.vscode.extensions[]? // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            fi
+@functools.lru_cache(maxsize=1024)
+def _render_devcontainer_build_script(repo_name, url, branch):
+    """Render the devcontainer build context part of the init script.
+
+    Its only inputs are the primary repository's name, URL and branch, so
+    the rendering is memoized on those.
+    """
+    return _DEVCONTAINER_BUILD_TEMPLATE.substitute(
+        ws_debug='1' if app_config.WS_DEBUG else '',
+        repo_name=repo_name,
+        url=url,
+        branch=branch,
+        devcontainer_processing=_generate_devcontainer_processing_script(repo_name),
+        code_server_layers=_CODE_SERVER_DOCKERFILE_LAYERS.substitute(
+            code_server_image=app_config.CODE_SERVER_IMAGE
+        )
+    )
+
+
+# Every devcontainer.json field the init script uses, printed by a single jq pass
+# as NUL-terminated values in the order they are read back. Each field is guarded
+# with try so one malformed entry doesn't blank out the rest.
+_DEVCONTAINER_FIELDS_JQ = """
+(try ([.extensions[]? | select(.)] as $extensions | if ($extensions | length) > 0 then $extensions else [.customizations.vscode.extensions[]? | select(.)] end | join("\\n")) catch ""), "\\u0000",
+(try (.settings // .customizations.vscode.settings // "") catch ""), "\\u0000",
+(try (.features // "") catch ""), "\\u0000",
+(try ([.forwardPorts[]? | select(.) | tostring] | join("\\n")) catch ""), "\\u0000",
+(try (.customizations // "") catch ""), "\\u0000",
+(try ([.containerEnv // empty | to_entries[] | "\\(.key)=\\(.value)"] | join("\\n")) catch ""), "\\u0000",
+(try ([.remoteEnv // empty | to_entries[] | "\\(.key)=\\(.value)"] | join("\\n")) catch ""), "\\u0000",
+(try (.remoteUser // "") catch ""), "\\u0000",
+(try (.containerUser // "") catch ""), "\\u0000",
+(try (.postCreateCommand // "") catch ""), "\\u0000",
+(try (.postStartCommand // "") catch ""), "\\u0000",
+(try (.dockerComposeFile // "") catch ""), "\\u0000",
+(try (.service // "") catch ""), "\\u0000",
+(try (.workspaceFolder // "") catch ""), "\\u0000"
+"""
+
+_DEVCONTAINER_FIELD_VARS = [
+    "EXTENSIONS",
+    "SETTINGS",
+    "FEATURES",
+    "PORTS",
+    "CUSTOMIZATIONS",
+    "ENV_VARS",
+    "REMOTE_ENV_VARS",
+    "REMOTE_USER",
+    "CONTAINER_USER",
+    "POST_CREATE_CMD",
+    "POST_START_CMD",
+    "DOCKER_COMPOSE_FILE",
+    "SERVICE_NAME",
+    "WORKSPACE_FOLDER"
+]
+
+_READ_DEVCONTAINER_FIELDS = "\n".join(
+    f"                IFS= read -r -d '' {var} || true" for var in _DEVCONTAINER_FIELD_VARS
+)
+
+
+# Reads the devcontainer.json fields and writes the files derived from them
+_DEVCONTAINER_PROCESSING_TEMPLATE = _ScriptTemplate("""
+            # Parse devcontainer.json once and read every field from the jq output
+            {
+@@read_fields
+            } < <(jq -j '@@fields_jq' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             
             # Save extensions to file if found
             if [ ! -z "$EXTENSIONS" ]; then
@@ -572,57 +657,41 @@ def _generate_devcontainer_processing_script(repo_name):
                 echo "No extensions found in devcontainer.json or couldn't parse"
             fi
             
-            # Extract VS Code settings
-            SETTINGS=$(jq -r '.settings // .customizations.vscode.settings // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$SETTINGS" ]; then
                 echo "Found VS Code settings in devcontainer.json"
                 mkdir -p /workspaces/.vscode
                 echo "$SETTINGS" > /workspaces/.vscode/settings.json
             fi
             
-            # Extract features
-            FEATURES=$(jq -r '.features // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$FEATURES" ]; then
                 echo "Found features in devcontainer.json:"
                 echo "$FEATURES" > /workspaces/.devcontainer-features
                 echo "Features will be installed during workspace initialization"
             fi
             
-            # Extract port forwarding configuration
-            PORTS=$(jq -r '.forwardPorts[]? // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$PORTS" ]; then
                 echo "Found ports to forward in devcontainer.json:"
                 echo "$PORTS"
                 echo "$PORTS" > /workspaces/.forward-ports
             fi
             
-            # Extract other customizations
-            CUSTOMIZATIONS=$(jq -r '.customizations // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$CUSTOMIZATIONS" ]; then
                 echo "Found customizations in devcontainer.json"
                 echo "$CUSTOMIZATIONS" > /workspaces/.customizations
             fi
             
-            # Extract environment variables
-            ENV_VARS=$(jq -r '.containerEnv // empty | to_entries[] | "\\(.key)=\\(.value)"' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$ENV_VARS" ]; then
                 echo "Found environment variables in devcontainer.json:"
                 echo "$ENV_VARS"
                 echo "$ENV_VARS" > /workspaces/.container-env
             fi
             
-            # Extract remote environment variables
-            REMOTE_ENV_VARS=$(jq -r '.remoteEnv // empty | to_entries[] | "\\(.key)=\\(.value)"' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$REMOTE_ENV_VARS" ]; then
                 echo "Found remote environment variables in devcontainer.json:"
                 echo "$REMOTE_ENV_VARS"
                 echo "$REMOTE_ENV_VARS" > /workspaces/.remote-env
             fi
             
-            # Extract user configuration
-            REMOTE_USER=$(jq -r '.remoteUser // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            CONTAINER_USER=$(jq -r '.containerUser // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            
             if [ ! -z "$REMOTE_USER" ] || [ ! -z "$CONTAINER_USER" ]; then
                 echo "Found user configuration in devcontainer.json"
                 
@@ -637,8 +706,6 @@ def _generate_devcontainer_processing_script(repo_name):
                 fi
             fi
             
-            # Extract lifecycle commands
-            POST_CREATE_CMD=$(jq -r '.postCreateCommand // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$POST_CREATE_CMD" ]; then
                 echo "Found postCreateCommand in devcontainer.json"
                 echo "#!/bin/bash" > /workspaces/post-create-command.sh
@@ -646,7 +713,6 @@ def _generate_devcontainer_processing_script(repo_name):
                 chmod +x /workspaces/post-create-command.sh
             fi
             
-            POST_START_CMD=$(jq -r '.postStartCommand // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
             if [ ! -z "$POST_START_CMD" ]; then
                 echo "Found postStartCommand in devcontainer.json"
                 echo "#!/bin/bash" > /workspaces/post-start-command.sh
@@ -654,23 +720,28 @@ def _generate_devcontainer_processing_script(repo_name):
                 chmod +x /workspaces/post-start-command.sh
             fi
 
-            DOCKER_COMPOSE_FILE=$(jq -r '.dockerComposeFile // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            SERVICE_NAME=$(jq -r '.service // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-            WORKSPACE_FOLDER=$(jq -r '.workspaceFolder // empty' "$DEVCONTAINER_JSON_PATH" 2>/dev/null)
-
             if [ ! -z "$DOCKER_COMPOSE_FILE" ]; then
                 echo "Found dockerComposeFile in devcontainer.json: $DOCKER_COMPOSE_FILE"
                 echo "Service: $SERVICE_NAME"
                 echo "Workspace folder: $WORKSPACE_FOLDER"
                 
                 # Save docker-compose configuration
-                echo "{repo_name}/.devcontainer/$DOCKER_COMPOSE_FILE" > /workspaces/.docker-compose-file
+                echo "@@repo_name/.devcontainer/$DOCKER_COMPOSE_FILE" > /workspaces/.docker-compose-file
                 [ ! -z "$SERVICE_NAME" ] && echo "$SERVICE_NAME" > /workspaces/.docker-compose-service
                 [ ! -z "$WORKSPACE_FOLDER" ] && echo "$WORKSPACE_FOLDER" > /workspaces/.docker-compose-workspace-folder
                 
                 echo "Docker Compose configuration will be started during workspace initialization"
             fi
-    """
+    """)
+
+
+def _generate_devcontainer_processing_script(repo_name):
+    """Generate the devcontainer.json processing script"""
+    return _DEVCONTAINER_PROCESSING_TEMPLATE.substitute(
+        read_fields=_READ_DEVCONTAINER_FIELDS,
+        fields_jq=_DEVCONTAINER_FIELDS_JQ,
+        repo_name=repo_name
+    )
 
 
 def generate_helper_scripts():
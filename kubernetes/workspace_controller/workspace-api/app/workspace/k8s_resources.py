@@ -1,8 +1,13 @@
 import json
 import base64
+import copy
+import functools
 import time
 import logging
-from kubernetes import client
+import threading
+from datetime import datetime, timezone
+import orjson
+from kubernetes import client, watch
 from app.config import app_config
 from app.utils.scripts import (
     create_post_start_command, 
@@ -12,6 +17,79 @@ from app.utils.scripts import (
 
 logger = logging.getLogger(__name__)
 
+# The port-detector ConfigMap and wildcard certificate in workspace-system change
+# rarely (certificates rotate on the order of months), so copies are made from an
+# in-memory snapshot that is refreshed at most this often
+SOURCE_CACHE_TTL_SECONDS = 300
+
+_source_cache = {}
+_source_cache_lock = threading.Lock()
+
+
+def _read_cached_source(key, read):
+    """Return a cached workspace-system object, re-reading it once the TTL has expired"""
+    with _source_cache_lock:
+        cached = _source_cache.get(key)
+    if cached and time.monotonic() - cached[1] < SOURCE_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    source = read()
+    with _source_cache_lock:
+        _source_cache[key] = (source, time.monotonic())
+    return source
+
+
+# Field manager recorded on every object this controller applies
+FIELD_MANAGER = "workspace-controller"
+
+_APPLY_PATHS = {
+    ("v1", "ConfigMap"): "/api/v1/namespaces/{namespace}/configmaps/{name}",
+    ("v1", "PersistentVolumeClaim"): "/api/v1/namespaces/{namespace}/persistentvolumeclaims/{name}",
+    ("v1", "Secret"): "/api/v1/namespaces/{namespace}/secrets/{name}",
+    ("v1", "Service"): "/api/v1/namespaces/{namespace}/services/{name}",
+    ("v1", "ServiceAccount"): "/api/v1/namespaces/{namespace}/serviceaccounts/{name}",
+    ("apps/v1", "Deployment"): "/apis/apps/v1/namespaces/{namespace}/deployments/{name}",
+    ("networking.k8s.io/v1", "Ingress"): "/apis/networking.k8s.io/v1/namespaces/{namespace}/ingresses/{name}",
+}
+
+
+def _apply(body):
+    """Create or update a namespaced object with server-side apply.
+
+    Unlike a POST, an apply succeeds when the object already exists, so a repeated
+    or retried request converges instead of failing with 409 Conflict. The typed
+    API methods can't send the apply content type, hence the raw call_api.
+    """
+    body = app_config.api_client.sanitize_for_serialization(body)
+    metadata = body['metadata']
+    path = _APPLY_PATHS[(body['apiVersion'], body['kind'])].format(
+        namespace=metadata['namespace'],
+        name=metadata['name']
+    )
+    app_config.api_client.call_api(
+        path, 'PATCH',
+        query_params=[('fieldManager', FIELD_MANAGER), ('force', True)],
+        header_params={
+            'Accept': 'application/json',
+            'Content-Type': 'application/apply-patch+yaml'
+        },
+        body=body,
+        auth_settings=['BearerToken'],
+        _return_http_data_only=True
+    )
+
+
+# Namespace label tracking background initialization of the workspace resources
+INITIALIZATION_LABEL = "initialization"
+INITIALIZATION_IN_PROGRESS = "in-progress"
+INITIALIZATION_READY = "ready"
+INITIALIZATION_FAILED = "failed"
+
+# Initialization runs in a thread of the API worker, which can be restarted while
+# it is in progress and never record an outcome. A namespace still marked in
+# progress this long after it was created is treated as failed
+INITIALIZATION_TIMEOUT_SECONDS = 600
+
 
 def create_namespace(workspace_ids):
     """Create the Kubernetes namespace for the workspace"""
@@ -21,17 +99,78 @@ def create_namespace(workspace_ids):
             labels={
                 "app": "workspace",
                 "workspaceId": workspace_ids['workspace_id'],
-                "allowed-registry-access": "true"
+                "allowed-registry-access": "true",
+                INITIALIZATION_LABEL: INITIALIZATION_IN_PROGRESS
             }
         )
     )
     app_config.core_v1.create_namespace(namespace)
-    logger.info(f"Created namespace: {workspace_ids['namespace_name']}")
+    logger.info("Created namespace: %s", workspace_ids['namespace_name'])
+
+
+def set_initialization_state(namespace_name, state):
+    """Record the initialization state of a workspace on its namespace"""
+    app_config.core_v1.patch_namespace(
+        namespace_name,
+        {"metadata": {"labels": {INITIALIZATION_LABEL: state}}}
+    )
+    logger.info("Workspace namespace %s initialization %s", namespace_name, state)
+
+
+def get_initialization_state(namespace):
+    """Get the initialization state recorded on a namespace object, if any"""
+    labels = namespace.metadata.labels or {}
+    state = labels.get(INITIALIZATION_LABEL)
+    created = namespace.metadata.creation_timestamp
+    if state == INITIALIZATION_IN_PROGRESS and created is not None:
+        age = datetime.now(timezone.utc) - created
+        if age.total_seconds() > INITIALIZATION_TIMEOUT_SECONDS:
+            return INITIALIZATION_FAILED
+    return state
+
+
+def wait_for_namespace_deletion(namespace_name, timeout_seconds=60):
+    """Wait until a namespace is gone, returning False if it still exists after the timeout"""
+    field_selector = f"metadata.name={namespace_name}"
+    try:
+        # List first so a namespace that's already gone returns immediately, and
+        # the watch only sees events that happen after this snapshot
+        namespaces = app_config.core_v1.list_namespace(field_selector=field_selector)
+        if not namespaces.items:
+            return True
+
+        namespace_watch = watch.Watch()
+        for event in namespace_watch.stream(
+            app_config.core_v1.list_namespace,
+            field_selector=field_selector,
+            resource_version=namespaces.metadata.resource_version,
+            timeout_seconds=timeout_seconds
+        ):
+            if event['type'] == 'DELETED':
+                namespace_watch.stop()
+                return True
+        return False
+    except Exception as e:
+        logger.warning("Watch on namespace %s failed, falling back to polling: %s", namespace_name, e)
+
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            app_config.core_v1.read_namespace(namespace_name)
+        except client.rest.ApiException as e:
+            if e.status == 404:
+                return True
+            logger.warning("Could not read namespace %s while waiting for deletion: %s", namespace_name, e)
+            return False
+        time.sleep(1)
+    return False
 
 
 def create_persistent_volume_claim(workspace_ids):
     """Create PVC for workspace data"""
     pvc = client.V1PersistentVolumeClaim(
+        api_version="v1",
+        kind="PersistentVolumeClaim",
         metadata=client.V1ObjectMeta(
             name="workspace-data",
             namespace=workspace_ids['namespace_name'],
@@ -45,40 +184,44 @@ def create_persistent_volume_claim(workspace_ids):
             storage_class_name="efs-sc"
         )
     )
-    app_config.core_v1.create_namespaced_persistent_volume_claim(workspace_ids['namespace_name'], pvc)
-    logger.info(f"Created PVC in namespace: {workspace_ids['namespace_name']}")
+    _apply(pvc)
+    logger.info("Created PVC in namespace: %s", workspace_ids['namespace_name'])
 
 
-def create_workspace_secret(workspace_ids, github_token=None, github_username=None):
+def create_workspace_secret(workspace_ids, workspace_config):
     """Create secret for workspace credentials and optional GitHub token"""
-    string_data = {
-        "password": workspace_ids['password']
+    data = {
+        "password": _b64(workspace_ids['password'])
     }
 
-    if github_token:
-        string_data["github_token"] = github_token
-        string_data["github_username"] = github_username
+    if workspace_config.get('github_token'):
+        data["github_token"] = _b64(workspace_config['github_token'])
+        if workspace_config.get('github_username'):
+            data["github_username"] = _b64(workspace_config['github_username'])
 
     secret = client.V1Secret(
+        api_version="v1",
+        kind="Secret",
         metadata=client.V1ObjectMeta(
             name="workspace-secret",
             namespace=workspace_ids['namespace_name'],
             labels={"app": "workspace"}
         ),
-        string_data=string_data
+        data=data
     )
-    app_config.core_v1.create_namespaced_secret(workspace_ids['namespace_name'], secret)
-    logger.info(f"Created secret in namespace: {workspace_ids['namespace_name']}")
+    _apply(secret)
+    logger.info("Created secret in namespace: %s", workspace_ids['namespace_name'])
+
+
+def _b64(value):
+    """Encode a string value for the data field of a Secret"""
+    return base64.b64encode(value.encode()).decode()
 
 
 def create_init_script_configmap(workspace_ids, workspace_config):
     """Create ConfigMap with initialization scripts"""
     # Generate the comprehensive init script
-    init_script = generate_comprehensive_init_script(
-        workspace_ids, 
-        workspace_config, 
-        app_config.AWS_ACCOUNT_ID
-    )
+    init_script = generate_comprehensive_init_script(workspace_ids, workspace_config)
     
     # Generate helper scripts
     helper_scripts = generate_helper_scripts()
@@ -115,6 +258,8 @@ chmod +x /workspaces/run-lifecycle.sh
     """
     
     init_config_map = client.V1ConfigMap(
+        api_version="v1",
+        kind="ConfigMap",
         metadata=client.V1ObjectMeta(
             name="workspace-init",
             namespace=workspace_ids['namespace_name'],
@@ -124,60 +269,84 @@ chmod +x /workspaces/run-lifecycle.sh
             "init.sh": init_script
         }
     )
-    app_config.core_v1.create_namespaced_config_map(workspace_ids['namespace_name'], init_config_map)
-    logger.info(f"Created init script ConfigMap in namespace: {workspace_ids['namespace_name']}")
+    _apply(init_config_map)
+    logger.info("Created init script ConfigMap in namespace: %s", workspace_ids['namespace_name'])
 
 
-def create_workspace_info_configmap(workspace_ids, workspace_config):
-    """Create ConfigMap with workspace information"""
-    from datetime import datetime
-    
-    workspace_info = {
-        "id": workspace_ids['workspace_id'],
-        "repositories": workspace_config['github_urls'],
-        "branches": workspace_config['github_branches'],
-        "primaryRepo": workspace_config['primary_repo_url'],
-        "repoName": workspace_config['repo_name'],
-        "subdomain": workspace_ids['subdomain'],
-        "fqdn": workspace_ids['fqdn'],
-        "url": f"https://{workspace_ids['fqdn']}",
-        "password": workspace_ids['password'],
-        "created": datetime.now().isoformat()
-    }
+# Workspace info fields that aren't plain strings. Each field is stored under its
+# own ConfigMap key, lists as JSON arrays like portMappings and flags as
+# "true"/"false". Fields whose value is None are left out
+_WORKSPACE_INFO_LIST_FIELDS = ("repositories", "branches")
+_WORKSPACE_INFO_BOOL_FIELDS = ("customImage", "useDevContainer")
 
-    if workspace_config['use_custom_image_url']:
-        workspace_info["imageUrl"] = workspace_config['custom_image_url']
-        workspace_info["customImage"] = True
-    else:
-        workspace_info["image"] = workspace_config['custom_image']
-        workspace_info["customImage"] = False
-        workspace_info["useDevContainer"] = workspace_config['use_dev_container']
-    
+
+def create_workspace_info_configmap(workspace_ids, info_data):
+    """Create ConfigMap with workspace information encoded by encode_workspace_info"""
     info_config_map = client.V1ConfigMap(
+        api_version="v1",
+        kind="ConfigMap",
         metadata=client.V1ObjectMeta(
             name="workspace-info",
             namespace=workspace_ids['namespace_name'],
             labels={"app": "workspace-info"}
         ),
-        data={
-            "info": json.dumps(workspace_info)
-        }
+        data=info_data
     )
-    app_config.core_v1.create_namespaced_config_map(workspace_ids['namespace_name'], info_config_map)
-    logger.info(f"Created workspace info ConfigMap in namespace: {workspace_ids['namespace_name']}")
+    _apply(info_config_map)
+    logger.info("Created workspace info ConfigMap in namespace: %s", workspace_ids['namespace_name'])
+
+
+def encode_workspace_info(workspace_info):
+    """Flatten the workspace info into string ConfigMap data"""
+    data = {}
+    for key, value in workspace_info.items():
+        if value is None:
+            continue
+        if key in _WORKSPACE_INFO_LIST_FIELDS:
+            data[key] = orjson.dumps(value).decode()
+        elif key in _WORKSPACE_INFO_BOOL_FIELDS:
+            data[key] = "true" if value else "false"
+        else:
+            data[key] = str(value)
+    return data
+
+
+def read_workspace_info(config_map):
+    """Rebuild the workspace info dict from a workspace-info ConfigMap"""
+    data = config_map.data or {}
+    if "info" in data:
+        # Written before the fields were stored as separate keys
+        return orjson.loads(data["info"])
+
+    workspace_info = dict(data)
+    for key in _WORKSPACE_INFO_LIST_FIELDS:
+        if key in workspace_info:
+            workspace_info[key] = orjson.loads(workspace_info[key])
+    for key in _WORKSPACE_INFO_BOOL_FIELDS:
+        if key in workspace_info:
+            workspace_info[key] = workspace_info[key] == "true"
+    if "portMappings" in workspace_info:
+        # Maintained by the port detector as a JSON object
+        workspace_info["portMappings"] = orjson.loads(workspace_info["portMappings"])
+    return workspace_info
 
 
 def copy_port_detector_configmap(workspace_ids):
     """Copy port-detector ConfigMap from workspace-system to the new namespace"""
     try:
         # Get the ConfigMap from workspace-system
-        port_detector_cm = app_config.core_v1.read_namespaced_config_map(
-            name="port-detector", 
-            namespace="workspace-system"
+        port_detector_cm = _read_cached_source(
+            "configmap/port-detector",
+            lambda: app_config.core_v1.read_namespaced_config_map(
+                name="port-detector", 
+                namespace="workspace-system"
+            )
         )
         
         # Create a new ConfigMap in the workspace namespace
         new_cm = client.V1ConfigMap(
+            api_version="v1",
+            kind="ConfigMap",
             metadata=client.V1ObjectMeta(
                 name="port-detector",
                 namespace=workspace_ids['namespace_name'],
@@ -187,10 +356,10 @@ def copy_port_detector_configmap(workspace_ids):
         )
         
         # Create the ConfigMap in the new namespace
-        app_config.core_v1.create_namespaced_config_map(workspace_ids['namespace_name'], new_cm)
-        logger.info(f"Copied port-detector ConfigMap to namespace: {workspace_ids['namespace_name']}")
+        _apply(new_cm)
+        logger.info("Copied port-detector ConfigMap to namespace: %s", workspace_ids['namespace_name'])
         
-    except Exception as e:
+    except client.rest.ApiException as e:
         logger.error(f"Error copying port-detector ConfigMap: {e}")
         # Continue anyway, as this is not critical
 
@@ -199,14 +368,19 @@ def copy_wildcard_certificate(workspace_ids):
     """Copy wildcard certificate from workspace-system to the new namespace"""
     try:
         # Check if the wildcard certificate secret exists in workspace-system
-        wildcard_cert = app_config.core_v1.read_namespaced_secret(
-            name="workspace-domain-wildcard-tls", 
-            namespace="workspace-system"
+        wildcard_cert = _read_cached_source(
+            "secret/workspace-domain-wildcard-tls",
+            lambda: app_config.core_v1.read_namespaced_secret(
+                name="workspace-domain-wildcard-tls", 
+                namespace="workspace-system"
+            )
         )
         
         # Create a new secret in the workspace namespace with the same data
         wildcard_cert_data = wildcard_cert.data
         wildcard_cert_new = client.V1Secret(
+            api_version="v1",
+            kind="Secret",
             metadata=client.V1ObjectMeta(
                 name="workspace-domain-wildcard-tls",
                 namespace=workspace_ids['namespace_name'],
@@ -217,10 +391,10 @@ def copy_wildcard_certificate(workspace_ids):
         )
         
         # Create the secret in the new namespace
-        app_config.core_v1.create_namespaced_secret(workspace_ids['namespace_name'], wildcard_cert_new)
-        logger.info(f"Copied wildcard certificate secret to namespace: {workspace_ids['namespace_name']}")
+        _apply(wildcard_cert_new)
+        logger.info("Copied wildcard certificate secret to namespace: %s", workspace_ids['namespace_name'])
         
-    except Exception as e:
+    except client.rest.ApiException as e:
         logger.error(f"Error copying wildcard certificate: {e}")
         # Continue anyway, but log it - this might cause SSL errors
 
@@ -228,6 +402,8 @@ def copy_wildcard_certificate(workspace_ids):
 def create_pvc_for_registry(workspace_ids):
     """Create PVC for local registry storage"""
     pvc = client.V1PersistentVolumeClaim(
+        api_version="v1",
+        kind="PersistentVolumeClaim",
         metadata=client.V1ObjectMeta(
             name="registry-storage",
             namespace=workspace_ids['namespace_name']
@@ -240,87 +416,169 @@ def create_pvc_for_registry(workspace_ids):
             storage_class_name="efs-sc"
         )
     )
-    app_config.core_v1.create_namespaced_persistent_volume_claim(workspace_ids['namespace_name'], pvc)
-    logger.info(f"Created registry storage PVC in namespace: {workspace_ids['namespace_name']}")
+    _apply(pvc)
+    logger.info("Created registry storage PVC in namespace: %s", workspace_ids['namespace_name'])
 
 
-def create_service_account(workspace_namespace):
+def create_service_account(workspace_ids):
     """Create service account for the workspace"""
     service_account = client.V1ServiceAccount(
+        api_version="v1",
+        kind="ServiceAccount",
         metadata=client.V1ObjectMeta(
             name="workspace-controller",
-            namespace=workspace_namespace,
+            namespace=workspace_ids['namespace_name'],
             annotations={
-                "eks.amazonaws.com/role-arn": f"arn:aws:iam::{app_config.AWS_ACCOUNT_ID}:role/workspace-controller-role"
+                "eks.amazonaws.com/role-arn": app_config.WORKSPACE_ROLE_ARN
             }
         )
     )
     
     try:
-        app_config.core_v1.create_namespaced_service_account(
-            namespace=workspace_namespace,
-            body=service_account
-        )
-        logger.info(f"Created service account in namespace {workspace_namespace}")
-    except Exception as e:
+        _apply(service_account)
+        logger.info("Created service account in namespace %s", workspace_ids['namespace_name'])
+    except client.rest.ApiException as e:
         logger.error(f"Error creating service account: {e}")
 
 
-def create_registry_secret(workspace_ids):
-    """Create registry authentication secret"""
-    # Create a Docker config JSON with registry authentication
-    auth_config = {
-        "auths": {
-            "registry.workspace-system.svc.cluster.local:5000": {
-                "auth": ""  # Empty auth for registry without username/password
-            }
+# Docker config JSON for the in-cluster registry, which doesn't need a username or
+# password, so the encoded secret payload is the same for every workspace
+_REGISTRY_AUTH_B64 = base64.b64encode(json.dumps({
+    "auths": {
+        "registry.workspace-system.svc.cluster.local:5000": {
+            "auth": ""  # Empty auth for registry without username/password
         }
     }
+}).encode()).decode()
 
-    # Convert to base64
-    auth_json = json.dumps(auth_config).encode()
-    auth_b64 = base64.b64encode(auth_json).decode()
 
+def create_registry_secret(workspace_ids):
+    """Create registry authentication secret"""
     # Create the secret
     registry_secret = client.V1Secret(
+        api_version="v1",
+        kind="Secret",
         metadata=client.V1ObjectMeta(
             name="registry-credentials",
             namespace=workspace_ids['namespace_name']
         ),
         type="kubernetes.io/dockerconfigjson",
         data={
-            ".dockerconfigjson": auth_b64
+            ".dockerconfigjson": _REGISTRY_AUTH_B64
         }
     )
 
     # Create the secret in the namespace
-    app_config.core_v1.create_namespaced_secret(
-        namespace=workspace_ids['namespace_name'],
-        body=registry_secret
-    )
-    logger.info(f"Created registry secret in namespace: {workspace_ids['namespace_name']}")
+    _apply(registry_secret)
+    logger.info("Created registry secret in namespace: %s", workspace_ids['namespace_name'])
 
 
 def create_deployment(workspace_ids, workspace_config):
-    """Create deployment for the code-server"""
-    # Create storage for local registry
-    create_pvc_for_registry(workspace_ids)
+    """Create deployment for the code-server.
+
+    Expects the registry PVC, service account and registry secret to exist already.
+    """
+    deployment = _render_deployment(workspace_ids, workspace_config)
+    _apply(deployment)
+    logger.info("Created deployment in namespace: %s", workspace_ids['namespace_name'])
+
+
+# Identifiers used to build the deployment templates; every field derived from
+# them is overwritten by _render_deployment before anything is sent
+_TEMPLATE_WORKSPACE_IDS = {
+    'workspace_id': 'template',
+    'subdomain': 'template',
+    'namespace_name': 'template',
+    'fqdn': 'template',
+    'build_timestamp': 0,
+    'password': ''
+}
+
+_deployment_templates = {}
+_deployment_templates_lock = threading.Lock()
+
+
+def _get_deployment_template(use_dev_container):
+    """Return the serialized deployment shared by all workspaces with the same dev container mode"""
+    with _deployment_templates_lock:
+        template = _deployment_templates.get(use_dev_container)
+        if template is None:
+            deployment = _build_deployment(_TEMPLATE_WORKSPACE_IDS, {'use_dev_container': use_dev_container})
+            template = app_config.api_client.sanitize_for_serialization(deployment)
+            _deployment_templates[use_dev_container] = template
+    return template
+
+
+def _render_deployment(workspace_ids, workspace_config):
+    """Render the deployment body for a workspace from its cached template.
+
+    Building the V1Deployment model tree means hundreds of model constructions,
+    so it is done once per shape and only the workspace-specific fields are patched.
+    """
+    deployment = copy.deepcopy(_get_deployment_template(workspace_config['use_dev_container']))
+    deployment['metadata']['namespace'] = workspace_ids['namespace_name']
+
+    pod_template = deployment['spec']['template']
+    pod_template['metadata']['annotations'].update(_create_restart_annotations())
 
+    pod_spec = pod_template['spec']
+    containers = {
+        container['name']: container
+        for container in pod_spec['initContainers'] + pod_spec['containers']
+    }
+    _set_kaniko_destination(containers['build-workspace-image'], _workspace_image(workspace_ids, "custom-wrapper"))
+
+    code_server = containers['code-server']
+    code_server['image'] = _workspace_image(workspace_ids, "custom-wrapper")
+    for env_var in code_server['env']:
+        if env_var['name'] == "VSCODE_PROXY_URI":
+            env_var['value'] = _vscode_proxy_uri(workspace_ids)
+
+    return deployment
+
+
+def _set_kaniko_destination(container, destination):
+    """Point a serialized Kaniko container at a new push destination"""
+    container['args'] = [
+        f"--destination={destination}" if arg.startswith("--destination=") else arg
+        for arg in container['args']
+    ]
+
+
+def _workspace_image(workspace_ids, tag_prefix):
+    """Return the ECR image reference for one of the workspace's built images"""
+    return f"{app_config.WORKSPACE_IMAGE_REPOSITORY}:{tag_prefix}-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}"
+
+
+def _vscode_proxy_uri(workspace_ids):
+    """Return the code-server proxy URI template for forwarded ports"""
+    return f"https://{workspace_ids['subdomain']}-{{{{port}}}}.{app_config.WORKSPACE_DOMAIN}/"
+
+
+def _create_restart_annotations():
+    """Create the pod annotations that change on every rollout"""
+    revision = str(int(time.time()))
+    return {
+        "deployment.kubernetes.io/revision": revision,
+        "kubectl.kubernetes.io/restartedAt": revision
+    }
+
+
+def _build_deployment(workspace_ids, workspace_config):
+    """Build the deployment model for the code-server"""
     # Define init containers
     init_containers = _create_init_containers(workspace_ids, workspace_config)
 
     # Define volumes
-    volumes = _create_volumes(workspace_ids)
-
-    # Create service account and registry secret
-    create_service_account(workspace_ids['namespace_name'])
-    create_registry_secret(workspace_ids)
+    volumes = _create_volumes()
 
     # Define containers
     code_server_container = _create_code_server_container(workspace_ids, workspace_config)
     port_detector_container = _create_port_detector_container()
 
-    deployment = client.V1Deployment(
+    return client.V1Deployment(
+        api_version="apps/v1",
+        kind="Deployment",
         metadata=client.V1ObjectMeta(
             name="code-server",
             namespace=workspace_ids['namespace_name'],
@@ -343,8 +601,7 @@ def create_deployment(workspace_ids, workspace_config):
                     annotations={
                         # Add this to allow insecure registry
                         "container.apparmor.security.beta.kubernetes.io/code-server": "unconfined",
-                        "deployment.kubernetes.io/revision": str(int(time.time())),
-                        "kubectl.kubernetes.io/restartedAt": str(int(time.time()))
+                        **_create_restart_annotations()
                     }
                 ),
                 spec=client.V1PodSpec(
@@ -361,48 +618,65 @@ def create_deployment(workspace_ids, workspace_config):
         )
     )
 
-    app_config.apps_v1.create_namespaced_deployment(workspace_ids['namespace_name'], deployment)
-    logger.info(f"Created deployment in namespace: {workspace_ids['namespace_name']}")
-
 
 def _create_init_containers(workspace_ids, workspace_config):
     """Create the initialization containers for the deployment"""
     init_containers = [
         _create_workspace_init_container(),
-        _create_base_image_kaniko_container(workspace_ids),
-        _create_wrapper_kaniko_container(workspace_ids)
+        _create_workspace_image_kaniko_container(workspace_ids)
     ]
     return init_containers
 
 
-def _create_workspace_init_container():
-    """Create the main workspace initialization container"""
-    env_vars = []
-    # Add GITHUB_TOKEN env var if present in secret
-    env_vars.append(
-        client.V1EnvVar(
-            name="GITHUB_TOKEN",
-            value_from=client.V1EnvVarSource(
-                secret_key_ref=client.V1SecretKeySelector(
-                    name="workspace-secret",
-                    key="github_token",
-                    optional=True
-                )
-            )
-        )
-    )
-    env_vars.append(
-        client.V1EnvVar(
-            name="GITHUB_USERNAME",
-            value_from=client.V1EnvVarSource(
-                secret_key_ref=client.V1SecretKeySelector(
-                    name="workspace-secret",
-                    key="github_username",
-                    optional=True
-                )
+def _optional_secret_env_var(name, key):
+    """Create an env var sourced from an optional key of the workspace secret"""
+    return client.V1EnvVar(
+        name=name,
+        value_from=client.V1EnvVarSource(
+            secret_key_ref=client.V1SecretKeySelector(
+                name="workspace-secret",
+                key=key,
+                optional=True
             )
         )
     )
+
+
+# GitHub credentials, exposed to every container that touches the repositories
+_GITHUB_ENV_VARS = [
+    _optional_secret_env_var("GITHUB_TOKEN", "github_token"),
+    _optional_secret_env_var("GITHUB_USERNAME", "github_username")
+]
+
+# Flags and environment shared by every Kaniko build; only the build context
+# and destination differ per workspace
+_KANIKO_BUILD_FLAGS = [
+    "--insecure",
+    "--skip-tls-verify",
+    "--verbosity=debug",
+    "--push-retry=3",
+    # Layers are cached in the registry under a key derived from the Dockerfile
+    # command and the build context files it uses, so a rebuild of an unchanged
+    # Dockerfile and devcontainer only pulls the layers instead of running them
+    "--cache=true",
+    f"--cache-repo={app_config.WORKSPACE_IMAGE_CACHE_REPOSITORY}",
+    "--cache-copy-layers=true",
+    "--cache-ttl=336h"
+]
+
+_KANIKO_ENV_VARS = [
+    client.V1EnvVar(name="DOCKER_CONFIG", value="/kaniko/.docker/"),
+    client.V1EnvVar(name="HTTP_TIMEOUT", value="600s"),  # Increase timeout
+    client.V1EnvVar(name="HTTPS_TIMEOUT", value="600s")
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _create_workspace_init_container():
+    """Create the main workspace initialization container.
+
+    The spec is identical for every workspace, so it is built once and shared.
+    """
     return client.V1Container(
         name="init-workspace",
         image="buildpack-deps:22.04-scm",
@@ -424,7 +698,7 @@ def _create_workspace_init_container():
                 sub_path="workspaces"
             ),
             client.V1VolumeMount(
-                name="init-script",  # Add this new volume mount
+                name="scripts",
                 mount_path="/scripts"  # Match the command's expected path
             ),
             client.V1VolumeMount(
@@ -432,70 +706,46 @@ def _create_workspace_init_container():
                 mount_path="/var/run/docker.sock"
             )
         ],
-        env=env_vars
+        env=_GITHUB_ENV_VARS
     )
 
 
-def _create_base_image_kaniko_container(workspace_ids):
-    """Create container for building user's base Docker image using Kaniko"""
+def _create_kaniko_container(name, sub_path, destination):
+    """Create a Kaniko build container for the build context under sub_path"""
     return client.V1Container(
-        name="build-base-image",
+        name=name,
         image="gcr.io/kaniko-project/executor:latest",
         args=[
             "--dockerfile=/workspace/Dockerfile",
             "--context=/workspace",
-            f"--destination={app_config.AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-user-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}",
-            "--insecure",
-            "--skip-tls-verify",
-            "--verbosity=debug",
-            "--push-retry=3"
-        ],
-        env=[
-            client.V1EnvVar(name="DOCKER_CONFIG", value="/kaniko/.docker/"),
-            client.V1EnvVar(name="HTTP_TIMEOUT", value="600s"),  # Increase timeout
-            client.V1EnvVar(name="HTTPS_TIMEOUT", value="600s")
-        ],
+            f"--destination={destination}"
+        ] + _KANIKO_BUILD_FLAGS,
+        env=_KANIKO_ENV_VARS,
         volume_mounts=[
             client.V1VolumeMount(
                 name="workspace-data",
                 mount_path="/workspace",
-                sub_path="workspaces/.user-dockerfile"  # Path to the user's Dockerfile
+                sub_path=sub_path
             )
         ]
     )
 
 
-def _create_wrapper_kaniko_container(workspace_ids):
-    """Create container for building code-server wrapper image using Kaniko"""
-    return client.V1Container(
-        name="build-wrapper-image",
-        image="gcr.io/kaniko-project/executor:latest",
-        args=[
-            "--dockerfile=/workspace/Dockerfile",
-            "--context=/workspace",
-            f"--destination={app_config.AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-wrapper-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}",
-            "--insecure",
-            "--skip-tls-verify",
-            "--verbosity=debug",
-            "--push-retry=3"
-        ],
-        env=[
-            client.V1EnvVar(name="DOCKER_CONFIG", value="/kaniko/.docker/"),
-            client.V1EnvVar(name="HTTP_TIMEOUT", value="600s"),  # Increase timeout
-            client.V1EnvVar(name="HTTPS_TIMEOUT", value="600s")
-        ],
-        volume_mounts=[
-            client.V1VolumeMount(
-                name="workspace-data",
-                mount_path="/workspace",
-                sub_path="workspaces/.code-server-wrapper"
-            )
-        ]
+def _create_workspace_image_kaniko_container(workspace_ids):
+    """Create container for building the user's image with code-server layered on top using Kaniko"""
+    return _create_kaniko_container(
+        "build-workspace-image",
+        "workspaces/.user-dockerfile",  # Path to the user's Dockerfile
+        _workspace_image(workspace_ids, "custom-wrapper")
     )
 
 
+@functools.lru_cache(maxsize=None)
 def _create_port_detector_container():
-    """Create the port detector container"""
+    """Create the port detector container.
+
+    The spec is identical for every workspace, so it is built once and shared.
+    """
     return client.V1Container(
         name="port-detector",
         image="ubuntu:22.04",
@@ -505,7 +755,7 @@ def _create_port_detector_container():
         ),
         volume_mounts=[
             client.V1VolumeMount(
-                name="port-detector-script",
+                name="scripts",
                 mount_path="/scripts"
             )
         ]
@@ -518,7 +768,7 @@ def _create_code_server_container(workspace_ids, workspace_config):
 
     return client.V1Container(
         name="code-server",
-        image=f"{app_config.AWS_ACCOUNT_ID}.dkr.ecr.us-east-1.amazonaws.com/workspace-images:custom-wrapper-{workspace_ids['namespace_name']}-{workspace_ids['build_timestamp']}",
+        image=_workspace_image(workspace_ids, "custom-wrapper"),
         image_pull_policy=image_pull_policy,
         env=[
             # LinuxServer.io specific environment variables
@@ -530,27 +780,8 @@ def _create_code_server_container(workspace_ids, workspace_config):
             client.V1EnvVar(name="CODE_SERVER_EXTENSIONS_DIR", value="/config/extensions"),
             client.V1EnvVar(name="VSCODE_USER_DATA_DIR", value="/config/data"),
             client.V1EnvVar(name="CS_DISABLE_GETTING_STARTED_OVERRIDE", value="true"),
-            client.V1EnvVar(name="VSCODE_PROXY_URI", value=f"https://{workspace_ids['subdomain']}-{{{{port}}}}.{app_config.WORKSPACE_DOMAIN}/"),
-            client.V1EnvVar(
-                name="GITHUB_TOKEN",
-                value_from=client.V1EnvVarSource(
-                    secret_key_ref=client.V1SecretKeySelector(
-                        name="workspace-secret",
-                        key="github_token",
-                        optional=True
-                    )
-                )
-            ),
-            client.V1EnvVar(
-                name="GITHUB_USERNAME",
-                value_from=client.V1EnvVarSource(
-                    secret_key_ref=client.V1SecretKeySelector(
-                        name="workspace-secret",
-                        key="github_username",
-                        optional=True
-                    )
-                )
-            ),
+            client.V1EnvVar(name="VSCODE_PROXY_URI", value=_vscode_proxy_uri(workspace_ids)),
+            *_GITHUB_ENV_VARS,
             client.V1EnvVar(
                 name="PASSWORD",
                 value_from=client.V1EnvVarSource(
@@ -629,56 +860,69 @@ def _create_code_server_volume_mounts(workspace_config):
     return volume_mounts
 
 
-def _create_volumes(workspace_ids):
-    """Create the volume definitions for the deployment"""
-    return [
-        client.V1Volume(
-            name="workspace-data",
-            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
-                claim_name="workspace-data"
-            )
-        ),
-        client.V1Volume(
-            name="registry-storage",
-            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
-                claim_name="registry-storage"
-            )
-        ),
-        client.V1Volume(
-            name="init-script",
-            config_map=client.V1ConfigMapVolumeSource(
-                name="workspace-init",
-                default_mode=0o755
-            )
-        ),
-        # Add volume for code-server in dev container mode
-        client.V1Volume(
-            name="code-server-data",
-            empty_dir=client.V1EmptyDirVolumeSource()
-        ),
-        # Docker volumes
-        client.V1Volume(
-            name="docker-lib",
-            empty_dir=client.V1EmptyDirVolumeSource()
-        ),
-        client.V1Volume(
-            name="docker-sock",
-            empty_dir=client.V1EmptyDirVolumeSource()
-        ),
-        # Port detector script
-        client.V1Volume(
-            name="port-detector-script",
-            config_map=client.V1ConfigMapVolumeSource(
-                name="port-detector",
-                default_mode=0o755
-            )
+# The deployment's volumes only reference fixed names, so they are the same for
+# every workspace
+_STATIC_VOLUMES = [
+    client.V1Volume(
+        name="workspace-data",
+        persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+            claim_name="workspace-data"
         )
-    ]
+    ),
+    client.V1Volume(
+        name="registry-storage",
+        persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+            claim_name="registry-storage"
+        )
+    ),
+    # Init and port detector scripts, projected from their ConfigMaps into one volume
+    client.V1Volume(
+        name="scripts",
+        projected=client.V1ProjectedVolumeSource(
+            default_mode=0o755,
+            sources=[
+                client.V1VolumeProjection(
+                    config_map=client.V1ConfigMapProjection(
+                        name="workspace-init",
+                        items=[client.V1KeyToPath(key="init.sh", path="init.sh", mode=0o755)]
+                    )
+                ),
+                client.V1VolumeProjection(
+                    config_map=client.V1ConfigMapProjection(
+                        name="port-detector",
+                        items=[client.V1KeyToPath(key="port-detector.sh", path="port-detector.sh", mode=0o755)]
+                    )
+                )
+            ]
+        )
+    ),
+    # Add volume for code-server in dev container mode
+    client.V1Volume(
+        name="code-server-data",
+        empty_dir=client.V1EmptyDirVolumeSource()
+    ),
+    # Docker volumes
+    client.V1Volume(
+        name="docker-lib",
+        empty_dir=client.V1EmptyDirVolumeSource()
+    ),
+    client.V1Volume(
+        name="docker-sock",
+        empty_dir=client.V1EmptyDirVolumeSource()
+    )
+]
+
+
+def _create_volumes():
+    """Create the volume definitions for the deployment"""
+    return list(_STATIC_VOLUMES)
 
 
 def create_service(workspace_ids):
     """Create service for the code-server"""
     service = client.V1Service(
+        api_version="v1",
+        kind="Service",
         metadata=client.V1ObjectMeta(
             name="code-server",
             namespace=workspace_ids['namespace_name'],
@@ -695,13 +939,15 @@ def create_service(workspace_ids):
             ]
         )
     )
-    app_config.core_v1.create_namespaced_service(workspace_ids['namespace_name'], service)
-    logger.info(f"Created service in namespace: {workspace_ids['namespace_name']}")
+    _apply(service)
+    logger.info("Created service in namespace: %s", workspace_ids['namespace_name'])
 
 
 def create_ingress(workspace_ids):
     """Create ingress for the code-server"""
     ingress = client.V1Ingress(
+        api_version="networking.k8s.io/v1",
+        kind="Ingress",
         metadata=client.V1ObjectMeta(
             name="code-server",
             namespace=workspace_ids['namespace_name'],
@@ -742,5 +988,5 @@ def create_ingress(workspace_ids):
             ]
         )
     )
-    app_config.networking_v1.create_namespaced_ingress(workspace_ids['namespace_name'], ingress)
-    logger.info(f"Created ingress in namespace: {workspace_ids['namespace_name']}")
\ No newline at end of file
+    _apply(ingress)
+    logger.info("Created ingress in namespace: %s", workspace_ids['namespace_name'])
\ No newline at end of file
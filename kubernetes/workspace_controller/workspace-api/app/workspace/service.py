@@ -1,5 +1,7 @@
-import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from kubernetes import client
 from datetime import datetime
 from app.config import app_config
 from app.utils.generators import generate_workspace_identifiers, extract_workspace_config
@@ -7,6 +9,10 @@ from app.workspace import k8s_resources
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent API requests across all workspace creations, so that
+# a burst of pool scaling doesn't flood the API server
+MAX_CONCURRENT_API_REQUESTS = 32
+
 
 class WorkspaceService:
     """Service class for workspace operations"""
@@ -15,6 +21,11 @@ class WorkspaceService:
         self.core_v1 = app_config.core_v1
         self.apps_v1 = app_config.apps_v1
         self.networking_v1 = app_config.networking_v1
+        # Shared by every workspace creation; its size bounds the concurrent API requests
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_API_REQUESTS,
+            thread_name_prefix="workspace-api"
+        )
     
     def list_workspaces(self):
         """List all workspaces"""
@@ -34,7 +45,7 @@ class WorkspaceService:
                     if not config_maps.items:
                         continue
                         
-                    workspace_info = json.loads(config_maps.items[0].data.get("info", "{}"))
+                    workspace_info = k8s_resources.read_workspace_info(config_maps.items[0])
                     
                     # Don't expose password
                     if "password" in workspace_info:
@@ -51,7 +62,7 @@ class WorkspaceService:
                         else:
                             workspace_info["state"] = pods.items[0].status.phase.lower()
                     else:
-                        workspace_info["state"] = "unknown"
+                        workspace_info["state"] = self._state_without_pods(ns)
                         
                     workspaces.append(workspace_info)
                 except Exception as e:
@@ -64,35 +75,49 @@ class WorkspaceService:
         return workspaces
     
     def create_workspace(self, request_data):
-        """Create a new workspace"""
+        """Create a new workspace, returning before its resources are fully provisioned"""
+        # Extract and validate request data; a ValueError here is a bad request
+        # and is left for the caller to report as such
+        workspace_config = extract_workspace_config(request_data)
+        
+        # Generate workspace identifiers
+        workspace_ids = generate_workspace_identifiers(app_config.WORKSPACE_DOMAIN)
+        
+        # Build the workspace info once for both the ConfigMap and the response
+        workspace_info = self._get_workspace_info(workspace_ids, workspace_config)
+        workspace_info_data = k8s_resources.encode_workspace_info(workspace_info)
+        
         try:
-            # Extract and validate request data
-            workspace_config = extract_workspace_config(request_data)
-            
-            # Generate workspace identifiers
-            workspace_ids = generate_workspace_identifiers(app_config.WORKSPACE_DOMAIN)
-            
-            # Create all Kubernetes resources
-            self._create_workspace_resources(workspace_ids, workspace_config)
-            
-            # Get workspace info for response
-            workspace_info = self._get_workspace_info(workspace_ids, workspace_config)
-            
-            return {
-                "success": True,
-                "message": "Workspace creation initiated",
-                "workspace": workspace_info
-            }
-            
+            # Create the namespace and info ConfigMap up front so the workspace is
+            # visible right away, then provision everything else in the background
+            k8s_resources.create_namespace(workspace_ids)
+            k8s_resources.create_workspace_info_configmap(workspace_ids, workspace_info_data)
         except Exception as e:
+            # Not only ApiException: a connection error or timeout would otherwise
+            # leave the namespace behind without its info ConfigMap
             logger.error(f"Error creating workspace: {e}")
             # Try to clean up if something went wrong
             try:
-                if 'workspace_ids' in locals():
-                    self.core_v1.delete_namespace(workspace_ids['namespace_name'])
-            except:
-                pass
+                self.core_v1.delete_namespace(workspace_ids['namespace_name'])
+            except client.rest.ApiException as cleanup_error:
+                if cleanup_error.status != 404:
+                    logger.warning(f"Could not clean up namespace {workspace_ids['namespace_name']}: {cleanup_error}")
+            except Exception as cleanup_error:
+                logger.warning(f"Could not clean up namespace {workspace_ids['namespace_name']}: {cleanup_error}")
             raise Exception(f"Failed to create workspace: {str(e)}")
+        
+        threading.Thread(
+            target=self._initialize_workspace,
+            args=(workspace_ids, workspace_config),
+            daemon=True,
+            name=f"workspace-init-{workspace_ids['workspace_id']}"
+        ).start()
+        
+        return {
+            "success": True,
+            "message": "Workspace creation initiated",
+            "workspace": workspace_info
+        }
     
     def get_workspace(self, workspace_id, include_password=False):
         """Get details for a specific workspace"""
@@ -103,7 +128,8 @@ class WorkspaceService:
             if not namespaces.items:
                 raise Exception("Workspace not found")
                 
-            namespace_name = namespaces.items[0].metadata.name
+            namespace = namespaces.items[0]
+            namespace_name = namespace.metadata.name
             
             # Get workspace info from config map
             config_maps = self.core_v1.list_namespaced_config_map(
@@ -113,7 +139,7 @@ class WorkspaceService:
             if not config_maps.items:
                 raise Exception("Workspace info not found")
                 
-            workspace_info = json.loads(config_maps.items[0].data.get("info", "{}"))
+            workspace_info = k8s_resources.read_workspace_info(config_maps.items[0])
             
             # Don't expose password unless explicitly requested
             if "password" in workspace_info and not include_password:
@@ -130,7 +156,7 @@ class WorkspaceService:
                 else:
                     workspace_info["state"] = pods.items[0].status.phase.lower()
             else:
-                workspace_info["state"] = "unknown"
+                workspace_info["state"] = self._state_without_pods(namespace)
             
             return workspace_info
         except Exception as e:
@@ -211,27 +237,65 @@ class WorkspaceService:
             logger.error(f"Error starting workspace: {e}")
             raise Exception(f"Failed to start workspace: {str(e)}")
     
-    def _create_workspace_resources(self, workspace_ids, workspace_config):
-        """Create all Kubernetes resources for the workspace"""
-        # Create the namespace
-        k8s_resources.create_namespace(workspace_ids)
-        
-        # Create storage and credentials
-        k8s_resources.create_persistent_volume_claim(workspace_ids)
-        k8s_resources.create_workspace_secret(workspace_ids, workspace_config.get('github_token'), workspace_config.get('github_username'))
+    def _initialize_workspace(self, workspace_ids, workspace_config):
+        """Create the remaining workspace resources and record the outcome on the namespace"""
+        namespace_name = workspace_ids['namespace_name']
+        try:
+            self._create_workspace_resources(workspace_ids, workspace_config)
+            state = k8s_resources.INITIALIZATION_READY
+        except client.rest.ApiException as e:
+            logger.error(f"Error initializing workspace {workspace_ids['workspace_id']}: {e}")
+            state = k8s_resources.INITIALIZATION_FAILED
+        except Exception:
+            # Anything else is a bug rather than an API failure, so keep the traceback
+            logger.exception(f"Unexpected error initializing workspace {workspace_ids['workspace_id']}")
+            state = k8s_resources.INITIALIZATION_FAILED
         
-        # Create initialization scripts
-        k8s_resources.create_init_script_configmap(workspace_ids, workspace_config)
-        k8s_resources.create_workspace_info_configmap(workspace_ids, workspace_config)
-
-        # Copy required ConfigMaps and Secrets
-        k8s_resources.copy_port_detector_configmap(workspace_ids)
-        k8s_resources.copy_wildcard_certificate(workspace_ids)
+        try:
+            k8s_resources.set_initialization_state(namespace_name, state)
+        except client.rest.ApiException as e:
+            # The namespace may have been deleted while it was initializing
+            logger.warning(f"Could not record initialization state for {namespace_name}: {e}")
+    
+    def _create_workspace_resources(self, workspace_ids, workspace_config):
+        """Create the Kubernetes resources inside an existing workspace namespace"""
+        # These resources don't depend on each other, so create them concurrently
+        # instead of paying one API round trip after another
+        self._run_concurrently([
+            # Storage and credentials
+            lambda: k8s_resources.create_persistent_volume_claim(workspace_ids),
+            lambda: k8s_resources.create_pvc_for_registry(workspace_ids),
+            lambda: k8s_resources.create_workspace_secret(workspace_ids, workspace_config),
+            # Initialization scripts
+            lambda: k8s_resources.create_init_script_configmap(workspace_ids, workspace_config),
+            # Copied ConfigMaps and Secrets
+            lambda: k8s_resources.copy_port_detector_configmap(workspace_ids),
+            lambda: k8s_resources.copy_wildcard_certificate(workspace_ids),
+            lambda: k8s_resources.create_registry_secret(workspace_ids),
+            lambda: k8s_resources.create_service_account(workspace_ids),
+            # Networking
+            lambda: k8s_resources.create_service(workspace_ids),
+            lambda: k8s_resources.create_ingress(workspace_ids),
+        ])
         
-        # Create Kubernetes resources
+        # The deployment references the service account, secrets and PVCs above
         k8s_resources.create_deployment(workspace_ids, workspace_config)
-        k8s_resources.create_service(workspace_ids)
-        k8s_resources.create_ingress(workspace_ids)
+    
+    def _state_without_pods(self, namespace):
+        """Report the state of a workspace that has no code-server pod"""
+        initialization_state = k8s_resources.get_initialization_state(namespace)
+        if initialization_state == k8s_resources.INITIALIZATION_IN_PROGRESS:
+            return "initializing"
+        if initialization_state == k8s_resources.INITIALIZATION_FAILED:
+            return "failed"
+        return "unknown"
+    
+    def _run_concurrently(self, tasks):
+        """Run independent API calls in parallel and re-raise the first failure"""
+        futures = [self._executor.submit(task) for task in tasks]
+        
+        for future in futures:
+            future.result()
     
     def _get_workspace_info(self, workspace_ids, workspace_config):
         """Create the workspace information dictionary"""
@@ -506,6 +506,40 @@ resource "aws_ecr_repository" "workspace_images" {
   }
 }
 
+# Layer cache for the workspace image builds
+resource "aws_ecr_repository" "workspace_images_cache" {
+  force_delete = true
+  name                 = "workspace-images-cache"
+  image_tag_mutability = "MUTABLE"
+
+  tags = {
+    Name = "workspace-images-cache"
+  }
+}
+
+# Cached layers past the builds' 14 day cache TTL are never used again
+resource "aws_ecr_lifecycle_policy" "workspace_images_cache_lifecycle" {
+  repository = aws_ecr_repository.workspace_images_cache.name
+
+  policy = jsonencode({
+    rules = [
+      {
+        rulePriority = 1,
+        description  = "Expire cached layers after 14 days",
+        selection = {
+          tagStatus   = "any",
+          countType   = "sinceImagePushed",
+          countUnit   = "days",
+          countNumber = 14
+        },
+        action = {
+          type = "expire"
+        }
+      }
+    ]
+  })
+}
+
 # Set up ECR lifecycle policy (optional but recommended)
 resource "aws_ecr_lifecycle_policy" "workspace_controller_lifecycle" {
   repository = aws_ecr_repository.workspace_controller.name
@@ -556,7 +590,10 @@ resource "aws_iam_policy" "ecr_limited_access" {
           "ecr:UploadLayerPart",
           "ecr:CompleteLayerUpload"
         ]
-        Resource = aws_ecr_repository.workspace_images.arn
+        Resource = [
+          aws_ecr_repository.workspace_images.arn,
+          aws_ecr_repository.workspace_images_cache.arn
+        ]
       },
       {
         Effect = "Allow"